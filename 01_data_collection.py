@@ -25,7 +25,10 @@ https://exoplanetarchive.ipac.caltech.edu/docs/TAP/usingTAP.html
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import pandas as pd
+import random
 import time
 from datetime import datetime
 import os
@@ -54,6 +57,28 @@ FIELDS = [
 # Output file name
 OUTPUT_FILE = "raw_exoplanets.csv"
 
+# Sidecar file holding the ETag of the last successful download. Sending it
+# back as If-None-Match lets the TAP service answer 304 Not Modified, so
+# reruns skip the multi-MB download entirely.
+ETAG_FILE = "raw_exoplanets.etag"
+
+# Explicit dtypes for the non-numeric columns (shared by both parse paths)
+CSV_DTYPES = {'pl_name': 'string', 'hostname': 'string',
+              'discoverymethod': 'category'}
+
+# Persistent session so retries reuse the same TCP/TLS connection instead of
+# paying a fresh handshake per attempt. Transient gateway errors (502/503/504)
+# are retried at the transport level; everything else stays in the observable
+# Python-level retry loop in query_nasa_tap().
+SESSION = requests.Session()
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.5,
+                      status_forcelist=[502, 503, 504],
+                      allowed_methods=["GET"])
+))
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
@@ -109,29 +134,58 @@ def query_nasa_tap(query, output_format="csv", max_retries=3):
         "query": query,
         "format": output_format
     }
-    
+
+    # Revalidate the cached download if we have one
+    headers = {}
+    if os.path.exists(ETAG_FILE) and os.path.exists(OUTPUT_FILE):
+        with open(ETAG_FILE) as f:
+            headers["If-None-Match"] = f.read().strip()
+
     for attempt in range(max_retries):
         try:
             print(f"Attempting API request (attempt {attempt + 1}/{max_retries})...")
-            response = requests.get(TAP_URL, params=params, timeout=60)
+            # stream=True: don't buffer the multi-MB CSV body here; the
+            # caller parses it straight off the socket.
+            response = SESSION.get(TAP_URL, params=params, headers=headers,
+                                   timeout=60, stream=True)
             response.raise_for_status()  # Raise exception for bad status codes
-            print(f"✓ Request successful! Received {len(response.content)} bytes")
+            if response.status_code == 304:
+                print("✓ Archive unchanged since last run (HTTP 304)")
+            else:
+                print(f"✓ Request successful! (status {response.status_code}, streaming body)")
             return response
             
         except requests.exceptions.Timeout:
             print(f"✗ Request timed out on attempt {attempt + 1}")
             if attempt < max_retries - 1:
-                wait_time = 2 ** attempt  # Exponential backoff
-                print(f"  Waiting {wait_time} seconds before retry...")
+                # Capped exponential backoff plus jitter so parallel runs
+                # don't all reconnect at the same instant
+                wait_time = min(30, 2 ** attempt) + random.uniform(0, 1)
+                print(f"  Waiting {wait_time:.1f} seconds before retry...")
                 time.sleep(wait_time)
             else:
                 raise Exception("Max retries exceeded: Request timed out")
-                
+
+        except requests.exceptions.HTTPError as e:
+            # Client errors (400/401/403/404) mean the query itself is bad;
+            # retrying will never succeed, so fail fast instead of burning
+            # the backoff budget. Only server errors are worth retrying.
+            if e.response is not None and e.response.status_code < 500:
+                print(f"✗ Client error {e.response.status_code} - not retrying")
+                raise
+            print(f"✗ Server error on attempt {attempt + 1}: {str(e)}")
+            if attempt < max_retries - 1:
+                wait_time = min(30, 2 ** attempt) + random.uniform(0, 1)
+                print(f"  Waiting {wait_time:.1f} seconds before retry...")
+                time.sleep(wait_time)
+            else:
+                raise Exception(f"Max retries exceeded: {str(e)}")
+
         except requests.exceptions.RequestException as e:
             print(f"✗ Request failed on attempt {attempt + 1}: {str(e)}")
             if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"  Waiting {wait_time} seconds before retry...")
+                wait_time = min(30, 2 ** attempt) + random.uniform(0, 1)
+                print(f"  Waiting {wait_time:.1f} seconds before retry...")
                 time.sleep(wait_time)
             else:
                 raise Exception(f"Max retries exceeded: {str(e)}")
@@ -152,29 +206,23 @@ def validate_dataframe(df, required_columns):
     -------
     dict : Validation report with statistics
     """
+    # One vectorized pass over the NA bitmap instead of a per-column loop
+    na_counts = df.isna().sum()
+
     report = {
         "total_rows": len(df),
         "total_columns": len(df.columns),
-        "missing_columns": [],
-        "missing_value_counts": {},
-        "data_types": {}
-    }
-    
-    # Check for missing columns
-    for col in required_columns:
-        if col not in df.columns:
-            report["missing_columns"].append(col)
-    
-    # Count missing values per column
-    for col in df.columns:
-        missing_count = df[col].isna().sum()
-        if missing_count > 0:
-            report["missing_value_counts"][col] = {
-                "count": int(missing_count),
-                "percentage": round(100 * missing_count / len(df), 2)
+        "missing_columns": [col for col in required_columns if col not in df.columns],
+        "missing_value_counts": {
+            col: {
+                "count": int(count),
+                "percentage": round(100 * count / len(df), 2)
             }
-        report["data_types"][col] = str(df[col].dtype)
-    
+            for col, count in na_counts.items() if count > 0
+        },
+        "data_types": df.dtypes.astype(str).to_dict()
+    }
+
     return report
 
 
@@ -245,9 +293,25 @@ def main():
     # Step 3: Load data into pandas DataFrame
     print("\nStep 3: Loading data into Pandas DataFrame...")
     try:
-        # Read CSV from response content
-        from io import StringIO
-        df = pd.read_csv(StringIO(response.text))
+        if response.status_code == 304:
+            # Server confirmed the cached copy is current - no download needed
+            print(f"Reading cached copy: '{OUTPUT_FILE}'")
+        else:
+            # Stream the body to disk first (so future runs can revalidate
+            # against the saved ETag), replacing the old copy atomically.
+            tmp_path = OUTPUT_FILE + ".tmp"
+            with open(tmp_path, "wb") as f:
+                for chunk in response.iter_content(chunk_size=1 << 20):
+                    f.write(chunk)
+            os.replace(tmp_path, OUTPUT_FILE)
+
+            etag = response.headers.get("ETag")
+            if etag:
+                with open(ETAG_FILE, "w") as f:
+                    f.write(etag)
+
+        # Parse from disk with the multithreaded pyarrow engine
+        df = pd.read_csv(OUTPUT_FILE, dtype=CSV_DTYPES, engine='pyarrow')
         print(f"✓ Successfully loaded {len(df):,} exoplanets")
         print(f"✓ Retrieved {len(df.columns)} columns")
     except Exception as e:
@@ -264,16 +328,10 @@ def main():
     print(df.head())
     print(f"\nShape: {df.shape[0]} rows × {df.shape[1]} columns\n")
     
-    # Step 6: Save to CSV
-    print(f"Step 5: Saving raw data to '{OUTPUT_FILE}'...")
-    try:
-        df.to_csv(OUTPUT_FILE, index=False)
-        file_size = os.path.getsize(OUTPUT_FILE)
-        print(f"✓ Successfully saved to {OUTPUT_FILE}")
-        print(f"  File size: {file_size:,} bytes ({file_size/1024:.2f} KB)")
-    except Exception as e:
-        print(f"✗ Error saving file: {str(e)}")
-        return
+    # Step 6: Confirm the on-disk copy (written in Step 3, or cached)
+    print(f"Step 5: Raw data saved at '{OUTPUT_FILE}'")
+    file_size = os.path.getsize(OUTPUT_FILE)
+    print(f"  File size: {file_size:,} bytes ({file_size/1024:.2f} KB)")
     
     # Step 7: Summary statistics
     print("\n" + "="*70)
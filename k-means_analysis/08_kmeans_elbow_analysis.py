@@ -1,12 +1,15 @@
 import psycopg2
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from sklearn.cluster import MiniBatchKMeans
 import getpass
 import os
 
+from fast_elbow import elbow_inertia
+from fast_fetch import fetch_df
+from feature_store import materialize_features, load_features
+
 # Database Connection Parameters
 DB_PARAMS = {
     'host': 'localhost',
@@ -64,7 +67,7 @@ def get_data_and_features(conn, stage_name):
     WHERE {db_col} = TRUE
     """
     
-    df = pd.read_sql(query, conn)
+    df = fetch_df(conn, query)
     
     # Drop rows that miss ANY of the required features for this specific stage
     # (e.g. Stage 1 won't drop rows just because Mass is missing)
@@ -76,50 +79,50 @@ def get_data_and_features(conn, stage_name):
         
     return df_clean, features
 
-def preprocess_and_plot(df, features, stage_name):
-    """Runs Elbow Method using the specific features for this stage."""
-    if len(df) < 10:
-        print(f"⚠️  Skipping {stage_name}: Not enough data points ({len(df)}).")
+def preprocess_and_plot(X_scaled, features, stage_name):
+    """Runs Elbow Method on the scaled feature matrix for this stage."""
+    if len(X_scaled) < 10:
+        print(f"⚠️  Skipping {stage_name}: Not enough data points ({len(X_scaled)}).")
         return
 
-    # 1. Log Transform
-    # We apply log transform to all features except maybe density if it's already scaled?
-    # Actually density spans orders of magnitude (0.1 g/cm3 to >100 g/cm3), so log is good.
-    X = df[features].copy()
-    
-    for col in features:
-        # Log10(x + epsilon)
-        X[col] = np.log10(X[col] + 1e-6)
-
-    # 2. Scale (StandardScaler)
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-
     # 3. Calculate Inertia
+    # The elbow only needs the *shape* of the inertia curve, so a single
+    # k-means++ run per k is enough here; the full n_init=10 fit is reserved
+    # for the chosen k in scripts 09/10. Fits are memoized on disk.
     inertia = []
     k_range = range(1, 11)
+    use_minibatch = len(X_scaled) > 5000
     for k in k_range:
-        kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-        kmeans.fit(X_scaled)
-        inertia.append(kmeans.inertia_)
+        if use_minibatch and k >= 4:
+            # Large sample + many clusters: MiniBatchKMeans traces the same
+            # elbow at a fraction of the Lloyd iterations.
+            mbk = MiniBatchKMeans(n_clusters=k, random_state=42, n_init=3,
+                                  batch_size=min(4096, len(X_scaled)))
+            mbk.fit(X_scaled)
+            inertia.append(mbk.inertia_)
+        else:
+            inertia.append(elbow_inertia(X_scaled, k, seed=42))
 
     # 4. Plot
-    plt.figure(figsize=(8, 5))
-    plt.plot(k_range, inertia, marker='o', linestyle='-', color='darkgreen', linewidth=2)
-    plt.title(f'Elbow Method: {stage_name}\n(N={len(df)} | Features: {len(features)})')
-    plt.xlabel('Number of Clusters (k)')
-    plt.ylabel('Inertia (WCSS)')
-    plt.xticks(k_range)
-    plt.grid(True, alpha=0.3)
+    # OO API: no pyplot global figure registry, and the figure is
+    # self-contained (safe for worker processes).
+    fig = Figure(figsize=(8, 5))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax.plot(k_range, inertia, marker='o', linestyle='-', color='darkgreen', linewidth=2)
+    ax.set_title(f'Elbow Method: {stage_name}\n(N={len(X_scaled)} | Features: {len(features)})')
+    ax.set_xlabel('Number of Clusters (k)')
+    ax.set_ylabel('Inertia (WCSS)')
+    ax.set_xticks(list(k_range))
+    ax.grid(True, alpha=0.3)
     
     # Save
     if not os.path.exists('query_results'):
         os.makedirs('query_results')
         
     safe_name = stage_name.lower().replace(' ', '_')
-    plt.savefig(f'query_results/elbow_{safe_name}.png')
+    fig.savefig(f'query_results/elbow_{safe_name}.png')
     print(f"✓ Saved plot: query_results/elbow_{safe_name}.png")
-    plt.close()
 
 if __name__ == "__main__":
     conn = get_db_connection()
@@ -128,9 +131,18 @@ if __name__ == "__main__":
         stages = ["Stage 1", "Stage 1c", "Stage 2", "Stage 2c"]
         
         for stage in stages:
-            df, feature_list = get_data_and_features(conn, stage)
-            if not df.empty:
-                preprocess_and_plot(df, feature_list, stage)
+            # Reuse the memmapped matrix if another script already built it;
+            # otherwise fetch, transform once, and materialize for them.
+            cached = load_features(stage)
+            if cached is not None:
+                print(f"Using cached feature matrix for {stage}...")
+                X_scaled, meta = cached
+                preprocess_and_plot(X_scaled, meta['features'], stage)
+            else:
+                df, feature_list = get_data_and_features(conn, stage)
+                if not df.empty:
+                    X_scaled = materialize_features(stage, df, feature_list)
+                    preprocess_and_plot(X_scaled, feature_list, stage)
         
         conn.close()
         print("\nAll elbow plots generated successfully.")
\ No newline at end of file
@@ -1,14 +1,20 @@
+import io
+
 import psycopg2
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib import cm
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import seaborn as sns
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from pandas.plotting import parallel_coordinates
+from matplotlib.collections import LineCollection
 import getpass
 import os
 
+from kmeans_cache import cached_fit
+from fast_fetch import fetch_df
+from feature_store import materialize_features
+
 # --- CONFIGURATION: HARDCODED K VALUES ---
 # We use k=3 for Stage 1 (Broad analysis: Radius/Period)
 # We use k=4 for Stage 2 (Deep analysis: Mass/Density reveals more groups)
@@ -58,7 +64,7 @@ def get_data(conn, stage_name):
         FROM planets 
         WHERE {db_col} = TRUE
     """
-    df = pd.read_sql(query, conn)
+    df = fetch_df(conn, query)
     
     # Drop rows that are missing ANY of the required features
     df_clean = df.dropna(subset=features).copy()
@@ -70,17 +76,11 @@ def run_kmeans_and_save(df, features, k, stage_name, conn):
     print(f"   > Running K-Means (k={k}) on {len(df)} planets...")
     
     # 1. Preprocess (Log Transform + Scaling)
-    X = df[features].copy()
-    for col in features:
-        # Log transform to handle astronomical scales
-        X[col] = np.log10(X[col] + 1e-6)
-        
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    # Materialized to the shared on-disk feature store so 08/10 can reuse it
+    X_scaled = materialize_features(stage_name, df, features)
     
-    # 2. Fit Model
-    kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)
-    labels = kmeans.fit_predict(X_scaled)
+    # 2. Fit Model (memoized - shares results with the elbow script)
+    labels, _, _ = cached_fit(X_scaled, k, seed=42, n_init=10)
     
     # Attach labels to dataframe for plotting and saving
     df['cluster_id'] = labels
@@ -91,15 +91,15 @@ def run_kmeans_and_save(df, features, k, stage_name, conn):
     if stage_name == "Stage 2c":
         print("   > Updating database 'cluster_id' column...")
         cursor = conn.cursor()
-        # Batch update is safer/faster for 2000+ rows
-        # We construct a list of tuples (cluster_id, planet_id)
-        update_values = list(zip(df['cluster_id'].astype(int), df['planet_id'].astype(int)))
-        
-        cursor.executemany("""
-            UPDATE planets 
-            SET cluster_id = %s 
-            WHERE planet_id = %s;
-        """, update_values)
+        # COPY the mapping into a temp table and merge with one UPDATE:
+        # a single sequential join instead of per-row index lookups.
+        cursor.execute("CREATE TEMP TABLE _cluster_map (pid int PRIMARY KEY, cid int) ON COMMIT DROP")
+        buf = io.StringIO()
+        pd.DataFrame({'pid': df['planet_id'].astype('int32'),
+                      'cid': df['cluster_id'].astype('int32')}).to_csv(buf, header=False, index=False)
+        buf.seek(0)
+        cursor.copy_expert("COPY _cluster_map FROM STDIN WITH CSV", buf)
+        cursor.execute("UPDATE planets p SET cluster_id = c.cid FROM _cluster_map c WHERE p.planet_id = c.pid")
         conn.commit()
         print("   > Database updated successfully.")
 
@@ -109,8 +109,11 @@ def run_kmeans_and_save(df, features, k, stage_name, conn):
         os.makedirs(output_dir)
 
     # A. Scatterplot (Mass vs Radius or Radius vs Period)
-    plt.figure(figsize=(10, 6))
-    
+    # OO API: self-contained figures, no pyplot global state to clean up
+    fig = Figure(figsize=(10, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+
     # Dynamic axis selection
     if 'pl_masse' in features:
         x_col, y_col = 'pl_masse', 'pl_rade'
@@ -122,31 +125,38 @@ def run_kmeans_and_save(df, features, k, stage_name, conn):
     sns.scatterplot(
         data=df, x=x_col, y=y_col, 
         hue='cluster_id', palette='viridis', 
-        style='cluster_id', s=80, alpha=0.8
+        style='cluster_id', s=80, alpha=0.8, ax=ax
     )
-    plt.xscale('log')
-    plt.yscale('log')
-    plt.title(f'K-Means Clusters: {stage_name} (k={k})')
-    plt.xlabel(x_lbl)
-    plt.ylabel(y_lbl)
-    plt.grid(True, which="both", ls="--", alpha=0.2)
-    plt.savefig(f'{output_dir}/scatter_{stage_name.lower().replace(" ", "_")}.png')
-    plt.close()
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_title(f'K-Means Clusters: {stage_name} (k={k})')
+    ax.set_xlabel(x_lbl)
+    ax.set_ylabel(y_lbl)
+    ax.grid(True, which="both", ls="--", alpha=0.2)
+    fig.savefig(f'{output_dir}/scatter_{stage_name.lower().replace(" ", "_")}.png')
 
     # B. Parallel Coordinates
-    plt.figure(figsize=(12, 6))
-    # Normalize data just for this plot (Z-score)
-    df_norm = df[features + ['cluster_id']].copy()
-    for col in features:
-        df_norm[col] = np.log10(df_norm[col] + 1e-6)
-        df_norm[col] = (df_norm[col] - df_norm[col].mean()) / df_norm[col].std()
-    
-    parallel_coordinates(df_norm, 'cluster_id', colormap='viridis', alpha=0.4)
-    plt.title(f'Cluster Profiles: {stage_name}')
-    plt.ylabel('Z-Score (Standardized Log Value)')
-    plt.xticks(rotation=15)
-    plt.savefig(f'{output_dir}/parallel_{stage_name.lower().replace(" ", "_")}.png')
-    plt.close()
+    # Drawn as ONE LineCollection (a single C-level draw call) instead of
+    # pandas' parallel_coordinates, which issues a plot call per row.
+    fig = Figure(figsize=(12, 6))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    # Reuse the matrix already log-transformed and z-scored for the fit -
+    # identical values, no second pass over the data
+    df_norm = pd.DataFrame(X_scaled, columns=features, index=df.index)
+    df_norm['cluster_id'] = labels
+
+    xs = np.arange(len(features))
+    ys = df_norm[features].to_numpy()
+    segs = np.stack([np.broadcast_to(xs, ys.shape), ys], axis=-1)  # (N, F, 2)
+    colors = cm.viridis((df_norm['cluster_id'] / max(k - 1, 1)).to_numpy())
+    ax.add_collection(LineCollection(segs, colors=colors, alpha=0.4))
+    ax.autoscale()
+    ax.set_xticks(xs)
+    ax.set_xticklabels(features, rotation=15)
+    ax.set_title(f'Cluster Profiles: {stage_name}')
+    ax.set_ylabel('Z-Score (Standardized Log Value)')
+    fig.savefig(f'{output_dir}/parallel_{stage_name.lower().replace(" ", "_")}.png')
     
     print(f"   > Visualizations saved to {output_dir}/")
 
@@ -1,14 +1,20 @@
+import io
+
 import psycopg2
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 import seaborn as sns
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
 import getpass
 import sys
 import os
 
+from joblib import Parallel, delayed
+
+from kmeans_cache import cached_fit
+from fast_fetch import fetch_df
+from feature_store import materialize_features
+
 # --- CONFIGURATION ---
 STAGES = {
     "Stage 1":  {"k": 3, "col": "cluster_s1",  "db_flag": "in_stage1",  "feats": ['pl_rade', 'pl_orbper', 'pl_eqt']},
@@ -42,74 +48,104 @@ def update_schema(conn):
     for stage, config in STAGES.items():
         col = config['col']
         try:
-            cursor.execute(f"ALTER TABLE planets ADD COLUMN IF NOT EXISTS {col} INTEGER;")
+            # k is at most 4, so int2 halves the column's footprint vs int4
+            cursor.execute(f"ALTER TABLE planets ADD COLUMN IF NOT EXISTS {col} SMALLINT;")
         except Exception:
             conn.rollback()
     conn.commit()
 
-def run_clustering(conn, stage_name):
+def fetch_all_stages(conn):
+    """
+    Fetches every stage's rows in ONE query instead of four round-trips.
+    The planets table is scanned once; stages are sliced in pandas.
+    """
+    feature_cols = ['pl_masse', 'pl_rade', 'pl_orbper', 'pl_eqt', 'density']
+    flag_cols = [config['db_flag'] for config in STAGES.values()]
+    # Cast the booleans to int so the CSV round-trip parses them as numbers
+    flag_select = ', '.join(f"{c}::int AS {c}" for c in flag_cols)
+    query = (
+        f"SELECT planet_id, pl_name, {', '.join(feature_cols)}, {flag_select} "
+        f"FROM planets WHERE {' OR '.join(flag_cols)}"
+    )
+    return fetch_df(conn, query)
+
+def run_clustering(stage_name, full_df):
+    """
+    Pure per-stage fit: slices the stage rows, fits K-Means and returns the
+    labeled frame. Takes no DB handle, so the four stages can run in
+    parallel worker processes (psycopg2 connections don't pickle).
+    """
     config = STAGES[stage_name]
     print(f"\nProcessing {stage_name} (k={config['k']})...")
-    
-    # 1. Fetch & Clean
+
+    # 1. Slice & Clean (no per-stage query - full_df was fetched once)
     features = config['feats']
-    query = f"SELECT planet_id, pl_name, {', '.join(features)} FROM planets WHERE {config['db_flag']} = TRUE"
-    df = pd.read_sql(query, conn).dropna(subset=features).copy()
-    
+    df = full_df[full_df[config['db_flag']] == 1].dropna(subset=features).copy()
+
     if len(df) < 10: return None
 
-    # 2. Preprocess & Fit
-    X = df[features].copy()
-    for col in features: X[col] = np.log10(X[col] + 1e-6)
-    
-    scaler = StandardScaler()
-    labels = KMeans(n_clusters=config['k'], random_state=42, n_init=10).fit_predict(scaler.fit_transform(X))
+    # 2. Preprocess & Fit (matrix lands in the shared feature store)
+    X_scaled = materialize_features(stage_name, df, features)
+    labels, _, _ = cached_fit(X_scaled, config['k'], seed=42, n_init=10)
     df['cluster_label'] = labels
-    
-    # 3. Save
+
+    return df
+
+def save_clusters(conn, results):
+    """
+    Writes every fitted stage's labels back by COPYing the (planet_id,
+    cluster) mapping into a temp table and merging with one UPDATE per
+    stage - a single sequential join instead of per-row index lookups.
+    """
     cursor = conn.cursor()
-    update_data = list(zip(df['cluster_label'].astype(int), df['planet_id'].astype(int)))
-    cursor.executemany(f"UPDATE planets SET {config['col']} = %s WHERE planet_id = %s", update_data)
+    cursor.execute("CREATE TEMP TABLE _cluster_map (pid int PRIMARY KEY, cid int) ON COMMIT DROP")
+    for stage_name, df in results.items():
+        if df is None: continue
+        config = STAGES[stage_name]
+        cursor.execute("TRUNCATE _cluster_map")
+        buf = io.StringIO()
+        pd.DataFrame({'pid': df['planet_id'].astype('int32'),
+                      'cid': df['cluster_label'].astype('int32')}).to_csv(buf, header=False, index=False)
+        buf.seek(0)
+        cursor.copy_expert("COPY _cluster_map FROM STDIN WITH CSV", buf)
+        cursor.execute(f"UPDATE planets p SET {config['col']} = c.cid FROM _cluster_map c WHERE p.planet_id = c.pid")
     conn.commit()
-    
-    return df
 
-def get_stage_stats(conn, stage_name):
-    config = STAGES[stage_name]
-    col = config['col']
-    
-    query = f"""
-        SELECT 
-            {col} as cluster_id,
-            COUNT(*) as count,
-            AVG(pl_rade) as avg_rad,
-            AVG(pl_orbper) as avg_period,
-            AVG(pl_eqt) as avg_temp
-        FROM planets
-        WHERE {col} IS NOT NULL
-        GROUP BY {col}
+def compute_stage_stats(stage_name, df):
     """
-    df = pd.read_sql(query, conn)
-    if df.empty: return None
-    
+    Per-cluster stats from the already-labeled frame. run_clustering holds
+    everything we need in memory, so no extra DB round-trip is required.
+    """
+    if df is None or df.empty: return None
+
+    stats = (df.groupby('cluster_label')
+               .agg(count=('pl_rade', 'size'),
+                    avg_rad=('pl_rade', 'mean'),
+                    avg_period=('pl_orbper', 'mean'),
+                    avg_temp=('pl_eqt', 'mean'))
+               .reset_index())
+
     # --- LOGIC: Sort by Radius to creating "Ranking" ---
     # Rank 1 = Smallest Cluster, Rank 4 = Largest Cluster
-    df = df.sort_values('avg_rad').reset_index(drop=True)
-    df['Size Rank'] = df.index + 1  
-    
+    stats = stats.sort_values('avg_rad').reset_index(drop=True)
+    stats['Size Rank'] = stats.index + 1
+
     # Create a nice label for the legend
     # e.g. "1 (Smallest)" vs "4 (Largest)"
-    df['Cluster Group'] = df['Size Rank'].apply(lambda x: f"Cluster #{x} (by Radius)")
-    
-    df['Stage'] = stage_name
-    return df
+    stats['Cluster Group'] = stats['Size Rank'].apply(lambda x: f"Cluster #{x} (by Radius)")
+
+    stats['Stage'] = stage_name
+    return stats
 
 def generate_comparison_dashboard(all_stats_df):
     """Creates a dashboard that distinctly shows 3 vs 4 bars."""
     print("\nGenerating Corrected Dashboard...")
     
     sns.set_style("whitegrid")
-    fig, axes = plt.subplots(2, 2, figsize=(16, 12))
+    # OO API: self-contained figure, no pyplot global figure manager
+    fig = Figure(figsize=(16, 12))
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(2, 2)
     fig.suptitle('Multi-Stage Cluster Analysis: Distinct Cluster Comparison', fontsize=20, weight='bold', y=0.95)
     
     # Custom Palette: Blue -> Green -> Orange -> Red
@@ -156,29 +192,34 @@ def generate_comparison_dashboard(all_stats_df):
         else:
             ax.legend().remove()
             
-    plt.tight_layout(rect=[0, 0.03, 1, 0.93])
+    fig.tight_layout(rect=[0, 0.03, 1, 0.93])
     
     if not os.path.exists('query_results'): os.makedirs('query_results')
-    plt.savefig('query_results/comparison_dashboard_v3.png', dpi=300)
+    fig.savefig('query_results/comparison_dashboard_v3.png', dpi=300)
     print("✓ Dashboard saved to: query_results/comparison_dashboard_v3.png")
 
 if __name__ == "__main__":
     conn = get_db_connection()
     update_schema(conn)
     
-    # 1. Run Clustering
-    for stage in STAGES.keys():
-        run_clustering(conn, stage)
+    # 1. Run Clustering (one table scan, then independent stages in parallel)
+    full_df = fetch_all_stages(conn)
+    fitted = Parallel(n_jobs=min(4, len(STAGES)))(
+        delayed(run_clustering)(stage, full_df) for stage in STAGES)
+    results = dict(zip(STAGES.keys(), fitted))
+
+    # 2. Write all labels back over the single main-process connection
+    save_clusters(conn, results)
         
-    # 2. Collect Stats
+    # 3. Collect Stats (computed locally from the fitted frames)
     all_stats = []
     print("\nCollecting Statistics...")
-    for stage in STAGES.keys():
-        stats = get_stage_stats(conn, stage)
+    for stage, df in results.items():
+        stats = compute_stage_stats(stage, df)
         if stats is not None:
             all_stats.append(stats)
             
-    # 3. Generate Chart
+    # 4. Generate Chart
     if all_stats:
         full_df = pd.concat(all_stats)
         generate_comparison_dashboard(full_df)
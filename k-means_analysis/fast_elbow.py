@@ -0,0 +1,97 @@
+"""
+Fast Elbow Inertia
+==================
+The elbow sweep only needs the inertia value for each k, not a fitted sklearn
+estimator. With our tiny feature counts (<=5), sklearn's per-fit setup and
+BLAS dispatch overhead dominate the actual distance math, so when Numba is
+installed (optional - see requirements.txt) we run a hand-rolled Lloyd
+iteration compiled to native code with parallel sample assignment. Without
+Numba, a pure-NumPy Lloyd loop does the same job: the ||x-c||^2 expansion
+turns the assignment step into one BLAS matmul per iteration, so even the
+fallback never touches sklearn's per-fit setup.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _lloyd(X, centers, max_iter):
+        """Lloyd iterations on X; returns the final inertia (WCSS)."""
+        n, f = X.shape
+        k = centers.shape[0]
+        labels = np.zeros(n, dtype=np.int64)
+
+        for _ in range(max_iter):
+            # Assignment step: parallel over samples, manual squared-L2
+            for i in prange(n):
+                best = 0
+                best_dist = np.inf
+                for j in range(k):
+                    d = 0.0
+                    for c in range(f):
+                        diff = X[i, c] - centers[j, c]
+                        d += diff * diff
+                    if d < best_dist:
+                        best_dist = d
+                        best = j
+                labels[i] = best
+
+            # Update step: k*f is tiny, serial accumulation is fine
+            sums = np.zeros((k, f), dtype=X.dtype)
+            counts = np.zeros(k, dtype=np.int64)
+            for i in range(n):
+                j = labels[i]
+                counts[j] += 1
+                for c in range(f):
+                    sums[j, c] += X[i, c]
+            for j in range(k):
+                if counts[j] > 0:
+                    for c in range(f):
+                        centers[j, c] = sums[j, c] / counts[j]
+
+        inertia = 0.0
+        for i in range(n):
+            j = labels[i]
+            for c in range(f):
+                diff = X[i, c] - centers[j, c]
+                inertia += diff * diff
+        return inertia
+
+
+def fast_inertia(X, k, seed=42, iters=25):
+    """
+    Pure-NumPy Lloyd loop returning only the inertia (WCSS). The squared
+    distance ||x-c||^2 = ||x||^2 + ||c||^2 - 2 x.cT is computed as one
+    (N,k) matrix per iteration, so the hot loop is a single BLAS matmul.
+    """
+    rng = np.random.default_rng(seed)
+    C = X[rng.choice(len(X), k, replace=False)].copy()
+    x2 = (X * X).sum(axis=1, keepdims=True)
+    for _ in range(iters):
+        d = x2 - 2 * (X @ C.T) + (C * C).sum(axis=1)
+        lbl = d.argmin(axis=1)
+        for j in range(k):
+            mask = lbl == j
+            if mask.any():
+                C[j] = X[mask].mean(axis=0)
+    return float(d[np.arange(len(X)), lbl].sum())
+
+
+def elbow_inertia(X_scaled, k, seed=42, max_iter=100):
+    """
+    Inertia for a single k. Uses the compiled Lloyd kernel when Numba is
+    available; otherwise runs the NumPy/BLAS loop above.
+    """
+    if not NUMBA_AVAILABLE:
+        return fast_inertia(X_scaled, k, seed=seed)
+
+    rng = np.random.default_rng(seed)
+    centers = X_scaled[rng.choice(len(X_scaled), k, replace=False)].copy()
+    return float(_lloyd(X_scaled, centers, max_iter))
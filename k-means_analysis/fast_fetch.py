@@ -0,0 +1,38 @@
+"""
+Fast DataFrame Fetch via PostgreSQL COPY
+========================================
+pd.read_sql round-trips every row through psycopg2's Python-level cursor,
+creating one Python object per cell before pandas can absorb it. Streaming
+the result set through PostgreSQL's COPY protocol into Arrow's multithreaded
+CSV reader skips the per-row Python work and hands back typed columns
+directly.
+"""
+
+import tempfile
+
+import pyarrow.csv as pacsv
+
+# Results up to this size are buffered in RAM; anything larger spills to a
+# temp file so a big SELECT can never blow up the client's memory.
+SPOOL_BYTES = 64 * 1024 * 1024
+
+
+def fetch_df(conn, query):
+    """
+    Run a SELECT and return the result as a pandas DataFrame.
+
+    The query is wrapped in COPY ... TO STDOUT so the server streams CSV
+    bytes into a spooled buffer (RAM up to SPOOL_BYTES, disk beyond),
+    which pyarrow then parses in parallel C++ code. Peak client memory is
+    therefore bounded by the parsed frame, not frame + full CSV text.
+    """
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as buf:
+        with conn.cursor() as cursor:
+            cursor.copy_expert(f"COPY ({query}) TO STDOUT WITH (FORMAT CSV, HEADER)", buf)
+        buf.seek(0)
+        table = pacsv.read_csv(buf)
+    # split_blocks + self_destruct: numeric columns become zero-copy views
+    # of the Arrow buffers where possible, and each Arrow column is freed
+    # as soon as it has been converted instead of coexisting with the
+    # finished frame.
+    return table.to_pandas(split_blocks=True, self_destruct=True)
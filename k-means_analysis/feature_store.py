@@ -0,0 +1,70 @@
+"""
+On-Disk Feature Store
+=====================
+Scripts 08/09/10 each re-query Postgres and re-run the identical
+log-transform + scaling before clustering the same rows. The transformed
+matrix is materialized once per stage as a float32 numpy memmap with a JSON
+sidecar (feature list, scaler parameters, planet ids). Any script that runs
+later just mmaps the file: zero-copy, page-cache resident, and no database
+round-trip for the fit input.
+"""
+
+import json
+import os
+
+import numpy as np
+from sklearn.preprocessing import StandardScaler
+
+CACHE_DIR = '.cache'
+
+
+def _paths(stage_name):
+    slug = stage_name.lower().replace(' ', '_')
+    base = os.path.join(CACHE_DIR, f'features_{slug}')
+    return base + '.f32', base + '.json'
+
+
+def materialize_features(stage_name, df, features):
+    """
+    Log-transforms + scales df[features], writes the result as a float32
+    memmap plus sidecar metadata, and returns the scaled matrix.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+
+    X = np.log10(df[features].to_numpy(dtype=np.float32) + np.float32(1e-6))
+    scaler = StandardScaler(copy=False)
+    X_scaled = scaler.fit_transform(X)
+
+    mmap_path, meta_path = _paths(stage_name)
+    mm = np.memmap(mmap_path, dtype='float32', mode='w+', shape=X_scaled.shape)
+    mm[:] = X_scaled
+    mm.flush()
+
+    meta = {
+        'features': list(features),
+        'shape': list(X_scaled.shape),
+        'mean': scaler.mean_.tolist(),
+        'scale': scaler.scale_.tolist(),
+        'planet_ids': (df['planet_id'].astype(int).tolist()
+                       if 'planet_id' in df.columns else None),
+    }
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+
+    return X_scaled
+
+
+def load_features(stage_name):
+    """
+    Returns (X_scaled, meta) for a previously materialized stage, or None
+    if nothing has been cached yet. X_scaled is a read-only memmap.
+    """
+    mmap_path, meta_path = _paths(stage_name)
+    if not (os.path.exists(mmap_path) and os.path.exists(meta_path)):
+        return None
+
+    with open(meta_path) as f:
+        meta = json.load(f)
+    X_scaled = np.memmap(mmap_path, dtype='float32', mode='r',
+                         shape=tuple(meta['shape']))
+    return X_scaled, meta
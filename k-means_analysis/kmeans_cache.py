@@ -0,0 +1,42 @@
+"""
+Shared K-Means Fit Cache
+========================
+The elbow script (08) and the execution scripts (09/10) repeatedly fit
+K-Means on the exact same scaled feature matrix. The fits are deterministic
+(fixed random_state), so we memoize them on disk with joblib: reruns and
+elbow-vs-execution runs share results instead of redoing the Lloyd iterations.
+
+The cache key is the raw bytes of the scaled matrix plus (k, seed, n_init),
+so any change to the data or parameters triggers a fresh fit.
+"""
+
+import numpy as np
+from joblib import Memory
+from sklearn.cluster import KMeans
+
+# Cache directory lives alongside the outputs so all scripts share it
+memory = Memory(location='.cache', verbose=0)
+
+
+@memory.cache
+def fit_kmeans(X_bytes, shape, dtype, k, seed, n_init):
+    """
+    Memoized K-Means fit.
+
+    Takes the matrix as raw bytes (hashable by joblib) and reconstructs it,
+    returning only the pieces the calling scripts actually use.
+
+    Returns:
+    -------
+    tuple : (labels, inertia, cluster_centers)
+    """
+    X = np.frombuffer(X_bytes, dtype=dtype).reshape(shape)
+    kmeans = KMeans(n_clusters=k, random_state=seed, n_init=n_init)
+    labels = kmeans.fit_predict(X)
+    return labels, kmeans.inertia_, kmeans.cluster_centers_
+
+
+def cached_fit(X_scaled, k, seed=42, n_init=10):
+    """Convenience front-end: hashes the array and calls the cached fit."""
+    return fit_kmeans(X_scaled.tobytes(), X_scaled.shape, X_scaled.dtype.str,
+                      k, seed, n_init)
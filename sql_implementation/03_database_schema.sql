@@ -101,6 +101,42 @@ CREATE INDEX idx_planets_radius ON planets(pl_rade);
 CREATE INDEX idx_planets_period ON planets(pl_orbper);
 CREATE INDEX idx_planets_temp ON planets(pl_eqt);
 
+-- Partial covering indexes for the stage-filtered analytical queries.
+-- A plain btree on a boolean is useless; these only index the rows each
+-- stage actually touches and INCLUDE the fetched columns, so the hot
+-- queries in 06_execute_queries.py become index-only scans.
+CREATE INDEX IF NOT EXISTS idx_planets_s1c_cover
+    ON planets(planet_id) INCLUDE (pl_name, pl_masse, pl_rade, density, star_id)
+    WHERE in_stage1c;
+CREATE INDEX IF NOT EXISTS idx_planets_s2_cover
+    ON planets(planet_id) INCLUDE (pl_name, pl_masse, pl_rade, density, star_id)
+    WHERE in_stage2;
+CREATE INDEX IF NOT EXISTS idx_planets_s2c_cover
+    ON planets(planet_id) INCLUDE (pl_name, pl_masse, pl_rade, density, star_id)
+    WHERE in_stage2c;
+
+-- Tiny BRIN over the stage flags: lets the stage_summary counts skip
+-- page ranges whose flags are uniform instead of heap-scanning the table
+CREATE INDEX IF NOT EXISTS brin_planets_stages
+    ON planets USING brin (in_stage1, in_stage1c, in_stage2, in_stage2c)
+    WITH (pages_per_range = 32);
+
+-- Partial descending indexes so the ORDER BY pl_masse DESC LIMIT N
+-- queries (verify_import's top-5 sample, planet_classification) read
+-- the first index tuples directly instead of sorting the whole stage
+CREATE INDEX IF NOT EXISTS idx_planets_s2_mass
+    ON planets (pl_masse DESC NULLS LAST)
+    WHERE in_stage2 AND pl_masse IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_planets_s2c_mass
+    ON planets (pl_masse DESC NULLS LAST)
+    WHERE in_stage2c AND pl_masse IS NOT NULL;
+
+-- Covering index for the mass/radius classification queries: the filter
+-- and CASE columns all come from the index, so the heap is never read
+CREATE INDEX IF NOT EXISTS idx_planets_mass_rad
+    ON planets (pl_masse, pl_rade) INCLUDE (pl_name, density)
+    WHERE pl_masse IS NOT NULL;
+
 -- ============================================================================
 -- DISCOVERIES TABLE
 -- ============================================================================
@@ -137,6 +173,11 @@ CREATE INDEX idx_discoveries_planet ON discoveries(planet_id);
 CREATE INDEX idx_discoveries_method ON discoveries(discoverymethod);
 CREATE INDEX idx_discoveries_year ON discoveries(disc_year);
 
+-- Covering index so the per-year discovery aggregate (the hottest
+-- GROUP BY in 06_execute_queries.py) is an index-only scan
+CREATE INDEX IF NOT EXISTS idx_discoveries_year_cover
+    ON discoveries(disc_year) INCLUDE (discoverymethod, planet_id);
+
 -- ============================================================================
 -- VIEWS FOR CONVENIENT QUERYING
 -- ============================================================================
@@ -211,6 +252,12 @@ CREATE TRIGGER update_discoveries_modtime
     FOR EACH ROW
     EXECUTE FUNCTION update_modified_column();
 
+-- Refresh planner statistics so the new indexes are chosen immediately
+-- instead of after the next autovacuum pass
+ANALYZE stars;
+ANALYZE planets;
+ANALYZE discoveries;
+
 -- ============================================================================
 -- VERIFICATION QUERIES
 -- ============================================================================
@@ -4,11 +4,13 @@ IMPROVED Database Import Script - NASA Exoplanet Data
 This version imports ALL stages and tracks which datasets each planet belongs to.
 """
 
-import pandas as pd
-import psycopg2
+import functools
+import io
+
 import sys
 import os
 import getpass
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
 # ============================================================================
@@ -25,24 +27,62 @@ DB_CONFIG = {
 # All stage files
 STAGE_FILES = {
     'stage1': 'cleaned_exoplanets_stage1.csv',
-    'stage1c': 'cleaned_exoplanets_stage1c.csv', 
+    'stage1c': 'cleaned_exoplanets_stage1c.csv',
     'stage2': 'cleaned_exoplanets_stage2.csv',
     'stage2c': 'cleaned_exoplanets_stage2c.csv'
 }
 
+# Explicit dtypes so the reader skips per-column inference; filtered to
+# each file's actual header in load_all_stages (e.g. Stage 1 has no
+# density column, and pandas 2.0/2.1 raise on dtype keys that do not
+# appear in the frame)
+STAGE_DTYPES = {
+    'pl_name': 'string', 'hostname': 'string', 'discoverymethod': 'string',
+    'pl_masse': 'float64', 'pl_rade': 'float64', 'pl_orbper': 'float64',
+    'pl_eqt': 'float64', 'density': 'float64', 'sy_dist': 'float64',
+    'disc_year': 'Int64',
+}
+
 # ============================================================================
 # HELPER FUNCTIONS
 # ============================================================================
 
+@functools.lru_cache(maxsize=None)
 def find_file(filename):
-    """Find file in current directory or parent directory."""
-    possible_paths = [filename, f'../{filename}', os.path.join('..', filename)]
-    for path in possible_paths:
+    """Find file in current directory or parent directory (cached)."""
+    # Only two distinct candidates - the old f'../{filename}' entry was a
+    # duplicate of os.path.join and cost a redundant stat() per lookup
+    for path in (filename, os.path.join('..', filename)):
         if os.path.exists(path):
             return path
     return None
 
 
+def table_is_empty(cursor, table):
+    """True if the table has no rows (cheap EXISTS probe, no full count)."""
+    cursor.execute(f"SELECT NOT EXISTS (SELECT 1 FROM {table})")
+    return cursor.fetchone()[0]
+
+
+def copy_dataframe(cursor, df, table, columns, chunksize=50_000):
+    """
+    Bulk-load df[columns] into table via COPY FROM STDIN. COPY bypasses
+    the extended-query protocol entirely, which is the fastest ingest path
+    PostgreSQL offers - several times faster than batched INSERTs.
+
+    Rows are streamed in chunks so the CSV text buffer stays O(chunksize)
+    instead of holding a second full copy of the frame in memory.
+    """
+    copy_sql = (
+        f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT CSV, NULL '')")
+    for start in range(0, len(df), chunksize):
+        buf = io.StringIO()
+        df.iloc[start:start + chunksize][columns].to_csv(
+            buf, header=False, index=False, na_rep='')
+        buf.seek(0)
+        cursor.copy_expert(copy_sql, buf)
+
+
 def load_all_stages():
     """Load all four stage datasets."""
     print("\n" + "="*80)
@@ -50,21 +90,37 @@ def load_all_stages():
     print("="*80)
     
     stages_data = {}
-    
-    for stage_name, filename in STAGE_FILES.items():
-        filepath = find_file(filename)
-        
-        if not filepath:
-            print(f"\n⚠ Warning: {filename} not found - skipping {stage_name}")
-            continue
-        
-        try:
-            df = pd.read_csv(filepath)
-            stages_data[stage_name] = df
-            print(f"\n✓ {stage_name}: {len(df):,} planets")
-            print(f"  Columns: {list(df.columns)}")
-        except Exception as e:
-            print(f"\n✗ Error loading {stage_name}: {e}")
+
+    # read_csv releases the GIL during the C-level parse, so four threads
+    # load the files in roughly the wall time of the slowest one
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = {}
+        for stage_name, filename in STAGE_FILES.items():
+            filepath = find_file(filename)
+
+            if not filepath:
+                print(f"\n⚠ Warning: {filename} not found - skipping {stage_name}")
+                continue
+
+            # Only pass dtypes for columns this file actually has: the
+            # stage files differ (no density before Stage 2)
+            with open(filepath) as f:
+                header = f.readline().rstrip('\n').split(',')
+            dtypes = {col: STAGE_DTYPES[col] for col in header
+                      if col in STAGE_DTYPES}
+
+            # pyarrow engine: multithreaded parse into typed columns
+            futures[stage_name] = executor.submit(
+                pd.read_csv, filepath, engine='pyarrow', dtype=dtypes)
+
+        for stage_name, future in futures.items():
+            try:
+                df = future.result()
+                stages_data[stage_name] = df
+                print(f"\n✓ {stage_name}: {len(df):,} planets")
+                print(f"  Columns: {list(df.columns)}")
+            except Exception as e:
+                print(f"\n✗ Error loading {stage_name}: {e}")
     
     if not stages_data:
         print("\n✗ No stage files found! Exiting.")
@@ -84,16 +140,10 @@ def create_unified_dataset(stages_data):
     # Start with Stage 1 as base (largest dataset)
     if 'stage1' in stages_data:
         df_unified = stages_data['stage1'].copy()
-        df_unified['in_stage1'] = True
     else:
         # Fallback to any available stage
         first_stage = list(stages_data.keys())[0]
         df_unified = stages_data[first_stage].copy()
-        df_unified['in_stage1'] = False
-    
-    # Initialize stage membership columns
-    for stage in ['stage1c', 'stage2', 'stage2c']:
-        df_unified[f'in_{stage}'] = False
 
     # === FIX START: MERGE DENSITY DATA ===
     # Explicitly copy 'density' from Stage 2 to the unified dataset
@@ -107,26 +157,36 @@ def create_unified_dataset(stages_data):
         df_unified['density'] = df_unified['pl_name'].map(density_map)
     # === FIX END ===
 
-    # Mark which stages each planet belongs to
-    for stage_name, stage_df in stages_data.items():
-        planet_names = set(stage_df['pl_name'])
-        df_unified[f'in_{stage_name}'] = df_unified['pl_name'].isin(planet_names)
-    
-    # For planets ONLY in Stage 2 (not in Stage 1), add them
+    # For planets ONLY in Stage 2 (not in Stage 1), add them.
+    # Index.difference diffs the two name sets with one sorted-merge pass
+    # instead of hashing the whole unified frame for an isin scan.
     if 'stage2' in stages_data:
-        stage2_only = stages_data['stage2'][
-            ~stages_data['stage2']['pl_name'].isin(df_unified['pl_name'])
-        ].copy()
-        
-        if len(stage2_only) > 0:
-            print(f"\n  Adding {len(stage2_only)} planets found only in Stage 2")
-            stage2_only['in_stage1'] = False
-            stage2_only['in_stage1c'] = False
-            stage2_only['in_stage2'] = True
-            stage2_only['in_stage2c'] = stage2_only['pl_name'].isin(
-                stages_data.get('stage2c', pd.DataFrame())['pl_name']
-            )
+        new_names = pd.Index(stages_data['stage2']['pl_name']).difference(
+            pd.Index(df_unified['pl_name']))
+
+        if len(new_names) > 0:
+            print(f"\n  Adding {len(new_names)} planets found only in Stage 2")
+            stage2_only = (stages_data['stage2']
+                           .set_index('pl_name').loc[new_names].reset_index())
             df_unified = pd.concat([df_unified, stage2_only], ignore_index=True)
+
+    # Mark which stages each planet belongs to. One long (pl_name, stage)
+    # frame pivoted to a boolean membership table and merged in a single
+    # hash join, instead of building a Python set + isin scan per stage.
+    # Running this after the stage2-only append also covers those rows.
+    membership = pd.concat(
+        [sdf[['pl_name']].assign(stage=f'in_{name}')
+         for name, sdf in stages_data.items()])
+    membership = (membership.pivot_table(index='pl_name', columns='stage',
+                                         aggfunc='size', fill_value=0) > 0)
+    df_unified = df_unified.merge(membership, left_on='pl_name',
+                                  right_index=True, how='left')
+    for stage in STAGE_FILES:
+        col = f'in_{stage}'
+        if col not in df_unified.columns:
+            df_unified[col] = False
+        else:
+            df_unified[col] = df_unified[col].fillna(False).astype(bool)
     
     print(f"\n✓ Unified dataset created: {len(df_unified):,} total unique planets")
     print(f"\n  Stage membership:")
@@ -149,21 +209,34 @@ def import_stars(conn, df):
     
     print(f"Found {len(stars_df):,} unique host stars")
     
-    star_id_map = {}
-    insert_query = """
-        INSERT INTO stars (hostname, sy_dist)
-        VALUES (%s, %s)
-        ON CONFLICT (hostname) DO UPDATE 
-        SET sy_dist = EXCLUDED.sy_dist
-        RETURNING star_id, hostname
-    """
-    
-    for idx, row in stars_df.iterrows():
-        cursor.execute(insert_query, (row['hostname'], row['sy_dist']))
-        star_id, hostname = cursor.fetchone()
-        star_id_map[hostname] = star_id
-    
-    conn.commit()
+    if table_is_empty(cursor, 'stars'):
+        # Initial load: nothing to conflict with, so stream straight in
+        # with COPY.
+        copy_dataframe(cursor, stars_df, 'stars', ['hostname', 'sy_dist'])
+    else:
+        # Rerun: COPY into a staging table and merge once. The IS DISTINCT
+        # FROM guard skips rewriting unchanged rows, so an idempotent rerun
+        # creates no dead tuples and almost no WAL.
+        cursor.execute("""
+            CREATE TEMP TABLE stage_stars
+                (hostname text, sy_dist double precision)
+            ON COMMIT DROP
+        """)
+        copy_dataframe(cursor, stars_df, 'stage_stars', ['hostname', 'sy_dist'])
+        cursor.execute("""
+            INSERT INTO stars (hostname, sy_dist)
+            SELECT hostname, sy_dist FROM stage_stars
+            ON CONFLICT (hostname) DO UPDATE
+            SET sy_dist = EXCLUDED.sy_dist
+            WHERE stars.sy_dist IS DISTINCT FROM EXCLUDED.sy_dist
+        """)
+
+    # Keep the id map as a Series so downstream hostname -> star_id
+    # lookups run as one vectorized join instead of dict.get per row
+    cursor.execute("SELECT hostname, star_id FROM stars")
+    star_id_map = (pd.DataFrame(cursor.fetchall(), columns=['hostname', 'star_id'])
+                     .set_index('hostname')['star_id'])
+
     print(f"✓ Imported {len(star_id_map):,} stars")
     cursor.close()
     return star_id_map
@@ -176,98 +249,120 @@ def import_planets_unified(conn, df, star_id_map):
     print("="*80)
     
     cursor = conn.cursor()
-    planet_id_map = {}
-    
-    insert_query = """
-        INSERT INTO planets (
-            pl_name, star_id, pl_masse, pl_rade, pl_orbper, pl_eqt, density,
-            in_stage1, in_stage1c, in_stage2, in_stage2c
-        )
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        ON CONFLICT (pl_name) DO UPDATE
-        SET pl_masse = EXCLUDED.pl_masse,
-            pl_rade = EXCLUDED.pl_rade,
-            pl_orbper = EXCLUDED.pl_orbper,
-            pl_eqt = EXCLUDED.pl_eqt,
-            density = EXCLUDED.density,
-            in_stage1 = EXCLUDED.in_stage1,
-            in_stage1c = EXCLUDED.in_stage1c,
-            in_stage2 = EXCLUDED.in_stage2,
-            in_stage2c = EXCLUDED.in_stage2c
-        RETURNING planet_id, pl_name
-    """
-    
-    inserted = 0
-    for idx, row in df.iterrows():
-        if row['hostname'] not in star_id_map:
-            continue
-        
-        star_id = star_id_map[row['hostname']]
-        
-        # Handle NaN values
-        pl_masse = None if pd.isna(row.get('pl_masse')) else float(row['pl_masse'])
-        pl_rade = None if pd.isna(row.get('pl_rade')) else float(row['pl_rade'])
-        pl_orbper = None if pd.isna(row.get('pl_orbper')) else float(row['pl_orbper'])
-        pl_eqt = None if pd.isna(row.get('pl_eqt')) else float(row['pl_eqt'])
-        density = None if pd.isna(row.get('density')) else float(row['density'])
-        
-        try:
-            cursor.execute(insert_query, (
-                row['pl_name'], star_id, pl_masse, pl_rade, pl_orbper, pl_eqt, density,
-                bool(row['in_stage1']), bool(row['in_stage1c']),
-                bool(row['in_stage2']), bool(row['in_stage2c'])
-            ))
-            planet_id, pl_name = cursor.fetchone()
-            planet_id_map[pl_name] = planet_id
-            inserted += 1
-            
-            if inserted % 100 == 0:
-                print(f"  Processed {inserted:,} planets...", end='\r')
-        except Exception as e:
-            print(f"\n⚠ Error inserting {row['pl_name']}: {e}")
-            conn.rollback()
-            continue
-    
-    conn.commit()
-    print(f"\n✓ Imported {inserted:,} planets with stage tracking")
+
+    # Vectorized prep instead of per-row pd.isna()/float() conversions:
+    # map hostname -> star_id in one pass, drop planets whose star is
+    # unknown, and turn every NaN into SQL NULL in a single where().
+    # reindex instead of a hard column selection: density only exists
+    # when the stage-2 file was loaded, and reindex turns a missing
+    # column into all-NaN (written as SQL NULLs) instead of a KeyError
+    sub = df.reindex(columns=['pl_name', 'hostname', 'pl_masse', 'pl_rade',
+                              'pl_orbper', 'pl_eqt', 'density', 'in_stage1',
+                              'in_stage1c', 'in_stage2', 'in_stage2c'])
+    sub['star_id'] = sub['hostname'].map(star_id_map)
+    skipped = sub['star_id'].isna().sum()
+    if skipped:
+        print(f"  Skipping {skipped:,} planets with unknown host star")
+    sub = sub.dropna(subset=['star_id'])
+    sub['star_id'] = sub['star_id'].astype(int)
+    for col in ['in_stage1', 'in_stage1c', 'in_stage2', 'in_stage2c']:
+        sub[col] = sub[col].astype(bool)
+    # Normalize the measurement columns to float64 in one C-level cast so
+    # the COPY serialization never falls back to object-dtype formatting
+    numeric_cols = ['pl_masse', 'pl_rade', 'pl_orbper', 'pl_eqt', 'density']
+    sub[numeric_cols] = sub[numeric_cols].astype('float64')
+
+    columns = ['pl_name', 'star_id', 'pl_masse', 'pl_rade', 'pl_orbper',
+               'pl_eqt', 'density', 'in_stage1', 'in_stage1c',
+               'in_stage2', 'in_stage2c']
+    sub = sub[columns]
+
+    if table_is_empty(cursor, 'planets'):
+        # Initial load: COPY the whole frame straight into the table.
+        copy_dataframe(cursor, sub, 'planets', columns)
+    else:
+        # Rerun: COPY into a staging table and merge once, skipping rows
+        # whose values are unchanged (no dead tuples, minimal WAL).
+        cursor.execute("""
+            CREATE TEMP TABLE stage_planets (
+                pl_name text, star_id int,
+                pl_masse double precision, pl_rade double precision,
+                pl_orbper double precision, pl_eqt double precision,
+                density double precision,
+                in_stage1 boolean, in_stage1c boolean,
+                in_stage2 boolean, in_stage2c boolean
+            ) ON COMMIT DROP
+        """)
+        copy_dataframe(cursor, sub, 'stage_planets', columns)
+        cursor.execute("""
+            INSERT INTO planets (
+                pl_name, star_id, pl_masse, pl_rade, pl_orbper, pl_eqt, density,
+                in_stage1, in_stage1c, in_stage2, in_stage2c
+            )
+            SELECT pl_name, star_id, pl_masse, pl_rade, pl_orbper, pl_eqt, density,
+                   in_stage1, in_stage1c, in_stage2, in_stage2c
+            FROM stage_planets
+            ON CONFLICT (pl_name) DO UPDATE
+            SET pl_masse = EXCLUDED.pl_masse,
+                pl_rade = EXCLUDED.pl_rade,
+                pl_orbper = EXCLUDED.pl_orbper,
+                pl_eqt = EXCLUDED.pl_eqt,
+                density = EXCLUDED.density,
+                in_stage1 = EXCLUDED.in_stage1,
+                in_stage1c = EXCLUDED.in_stage1c,
+                in_stage2 = EXCLUDED.in_stage2,
+                in_stage2c = EXCLUDED.in_stage2c
+            WHERE (planets.pl_masse, planets.pl_rade, planets.pl_orbper,
+                   planets.pl_eqt, planets.density, planets.in_stage1,
+                   planets.in_stage1c, planets.in_stage2, planets.in_stage2c)
+                  IS DISTINCT FROM
+                  (EXCLUDED.pl_masse, EXCLUDED.pl_rade, EXCLUDED.pl_orbper,
+                   EXCLUDED.pl_eqt, EXCLUDED.density, EXCLUDED.in_stage1,
+                   EXCLUDED.in_stage1c, EXCLUDED.in_stage2, EXCLUDED.in_stage2c)
+        """)
+
+    cursor.execute("SELECT pl_name, planet_id FROM planets")
+    planet_id_map = (pd.DataFrame(cursor.fetchall(), columns=['pl_name', 'planet_id'])
+                       .set_index('pl_name')['planet_id'])
+
+    print(f"\n✓ Imported {len(planet_id_map):,} planets with stage tracking")
     cursor.close()
     return planet_id_map
 
 
-def import_discoveries(conn, df, planet_id_map):
-    """Import discovery records."""
+def import_discoveries(conn, df):
+    """Import discovery records with a single server-side JOIN-UPSERT."""
     print("\n" + "="*80)
     print("IMPORTING DISCOVERIES")
     print("="*80)
-    
+
     cursor = conn.cursor()
-    insert_query = """
+
+    # COPY the raw records into a staging table, then resolve planet_id on
+    # the server with one JOIN-UPSERT - pl_name is unique in planets, so
+    # the lookup rides its index instead of shipping ids from Python.
+    cursor.execute("""
+        CREATE TEMP TABLE stage_discoveries
+            (pl_name text, discoverymethod text, disc_year int)
+        ON COMMIT DROP
+    """)
+
+    sub = df[['pl_name', 'discoverymethod', 'disc_year']].dropna(subset=['pl_name']).copy()
+    sub['disc_year'] = sub['disc_year'].astype('Int64')
+    copy_dataframe(cursor, sub, 'stage_discoveries',
+                   ['pl_name', 'discoverymethod', 'disc_year'])
+
+    cursor.execute("""
         INSERT INTO discoveries (planet_id, discoverymethod, disc_year)
-        VALUES (%s, %s, %s)
+        SELECT p.planet_id, v.discoverymethod, v.disc_year
+        FROM stage_discoveries v
+        JOIN planets p USING (pl_name)
         ON CONFLICT (planet_id) DO UPDATE
         SET discoverymethod = EXCLUDED.discoverymethod,
             disc_year = EXCLUDED.disc_year
-    """
-    
-    inserted = 0
-    for idx, row in df.iterrows():
-        if row['pl_name'] not in planet_id_map:
-            continue
-        
-        planet_id = planet_id_map[row['pl_name']]
-        discoverymethod = None if pd.isna(row.get('discoverymethod')) else str(row['discoverymethod'])
-        disc_year = None if pd.isna(row.get('disc_year')) else int(row['disc_year'])
-        
-        try:
-            cursor.execute(insert_query, (planet_id, discoverymethod, disc_year))
-            inserted += 1
-        except Exception as e:
-            print(f"\n⚠ Error: {e}")
-            conn.rollback()
-            continue
-    
-    conn.commit()
-    print(f"✓ Imported {inserted:,} discovery records")
+    """)
+
+    print(f"✓ Imported {cursor.rowcount:,} discovery records")
     cursor.close()
 
 
@@ -323,7 +418,18 @@ def main():
     print("NASA EXOPLANET DATABASE IMPORT (ALL STAGES)")
     print("="*80)
     print(f"Start Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    
+
+    # Bail out before paying for the heavy imports if there is nothing to do
+    if not any(find_file(fn) for fn in STAGE_FILES.values()):
+        print("\n✗ No stage files found! Exiting.")
+        sys.exit(1)
+
+    # pandas (and its C extensions) load only once we know there is data;
+    # the module functions resolve pd through these globals
+    global pd, psycopg2
+    import pandas as pd
+    import psycopg2
+
     # Load all stages
     stages_data = load_all_stages()
     
@@ -346,11 +452,19 @@ def main():
     try:
         conn = psycopg2.connect(**DB_CONFIG)
         print("✓ Connected to database")
-        
-        # Import data
+
+        # The load is fully reproducible from the CSVs, so skip the WAL
+        # flush wait on commit. SET LOCAL scopes it to the import
+        # transaction (psycopg2 opens it with this first statement).
+        with conn.cursor() as c:
+            c.execute("SET LOCAL synchronous_commit = OFF")
+
+        # Import data - all three steps share one transaction, so there
+        # is a single commit (one fsync) at the end instead of three
         star_id_map = import_stars(conn, df_unified)
-        planet_id_map = import_planets_unified(conn, df_unified, star_id_map)
-        import_discoveries(conn, df_unified, planet_id_map)
+        import_planets_unified(conn, df_unified, star_id_map)
+        import_discoveries(conn, df_unified)
+        conn.commit()
         
         # Verify
         verify_import(conn)
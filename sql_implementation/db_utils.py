@@ -0,0 +1,55 @@
+"""
+Shared Database Connection Helpers
+==================================
+run_schema.py, fix_database_schema.py and 06_execute_queries.py each
+carried their own copy of the connection config and their own password
+prompt. Keeping both here means one getpass per process, one place to
+tune connection parameters, and - via the PG_PASSWORD environment
+variable - no repeated prompts (or TLS/SCRAM renegotiation per script)
+when running the whole workflow from one shell.
+"""
+
+import getpass
+import os
+import sys
+
+import psycopg2
+
+DB_CONFIG = {
+    'host': 'localhost',
+    'port': 5432,
+    'database': 'exoplanet_db',
+    'user': 'postgres',
+    # TCP keepalives: on remote deployments an idle-connection timeout in
+    # a NAT/firewall along the path can silently drop a connection while
+    # a long statement runs server-side; probes keep it alive and detect
+    # a dead peer in ~60s instead of hanging on the OS default
+    'keepalives': 1,
+    'keepalives_idle': 30,
+    'keepalives_interval': 10,
+    'keepalives_count': 3,
+    # Password is prompted once per process (see get_password)
+}
+
+_password = None
+
+
+def get_password():
+    """Return the database password, prompting at most once per process.
+
+    PG_PASSWORD in the environment takes priority, so a shell that
+    exports it runs every script without any prompt.
+    """
+    global _password
+    if _password is None:
+        _password = os.environ.get('PG_PASSWORD') or getpass.getpass(
+            f"\nEnter password for user '{DB_CONFIG['user']}': ")
+        if not _password:
+            print("\n✗ Error: Password cannot be empty")
+            sys.exit(1)
+    return _password
+
+
+def get_connection():
+    """Open a connection using the shared config and cached password."""
+    return psycopg2.connect(**DB_CONFIG, password=get_password())
@@ -1,39 +1,23 @@
-import psycopg2
-import getpass
-
-# Database Configuration
-DB_PARAMS = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'exoplanet_db',
-    'user': 'postgres'
-}
+from db_utils import get_connection
 
 def add_cluster_column():
     """Adds the missing cluster_id column to the planets table."""
     try:
-        pwd = getpass.getpass(prompt='Enter PostgreSQL Database Password: ')
-        conn = psycopg2.connect(**DB_PARAMS, password=pwd)
+        conn = get_connection()
         conn.autocommit = True # Enable autocommit for DDL statements
         cursor = conn.cursor()
         
         print("Checking database schema...")
-        
-        # 1. Add the column
-        try:
-            print("Attempting to add 'cluster_id' column...")
-            cursor.execute("ALTER TABLE planets ADD COLUMN cluster_id INTEGER;")
-            print("✓ Success: Column 'cluster_id' added.")
-        except psycopg2.errors.DuplicateColumn:
-            print("ℹ Note: Column 'cluster_id' already exists.")
 
-        # 2. Add an index for performance (Optional but good practice)
-        try:
-            print("Creating index for faster queries...")
-            cursor.execute("CREATE INDEX IF NOT EXISTS idx_planets_cluster ON planets(cluster_id);")
-            print("✓ Success: Index created.")
-        except Exception as e:
-            print(f"Warning: Could not create index: {e}")
+        # Both statements are idempotent (IF NOT EXISTS), so they go out
+        # in one simple-query message - a single round-trip instead of
+        # two, and no DuplicateColumn handling needed on reruns.
+        print("Adding 'cluster_id' column and index (if missing)...")
+        cursor.execute("""
+            ALTER TABLE planets ADD COLUMN IF NOT EXISTS cluster_id INTEGER;
+            CREATE INDEX IF NOT EXISTS idx_planets_cluster ON planets(cluster_id);
+        """)
+        print("✓ Success: Schema is up to date.")
 
         conn.close()
         print("\nDatabase is now ready for K-Means results!")
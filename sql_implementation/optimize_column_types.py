@@ -0,0 +1,52 @@
+import psycopg2
+import getpass
+
+# Database Configuration
+DB_PARAMS = {
+    'host': 'localhost',
+    'port': 5432,
+    'database': 'exoplanet_db',
+    'user': 'postgres'
+}
+
+# Physical measurement columns that feed the float32 K-Means features.
+# Stored as double precision they cost twice the bytes on every read;
+# real (float4) keeps more precision than the analysis ever uses.
+REAL_COLUMNS = ['pl_masse', 'pl_rade', 'pl_orbper', 'pl_eqt', 'density']
+
+# Cluster labels are 0..3, so int2 is plenty
+SMALLINT_COLUMNS = ['cluster_id', 'cluster_s1', 'cluster_s1c', 'cluster_s2', 'cluster_s2c']
+
+def narrow_column_types():
+    """One-off migration: shrink the planets columns the pipeline reads hot."""
+    try:
+        pwd = getpass.getpass(prompt='Enter PostgreSQL Database Password: ')
+        conn = psycopg2.connect(**DB_PARAMS, password=pwd)
+        conn.autocommit = True  # DDL statements
+        cursor = conn.cursor()
+
+        print("Narrowing measurement columns to real (float4)...")
+        for col in REAL_COLUMNS:
+            try:
+                cursor.execute(f"ALTER TABLE planets ALTER COLUMN {col} TYPE real USING {col}::real;")
+                print(f"✓ planets.{col} -> real")
+            except Exception as e:
+                print(f"⚠ Skipped {col}: {e}")
+
+        print("\nNarrowing cluster label columns to smallint...")
+        for col in SMALLINT_COLUMNS:
+            try:
+                cursor.execute(f"ALTER TABLE planets ALTER COLUMN {col} TYPE smallint USING {col}::smallint;")
+                print(f"✓ planets.{col} -> smallint")
+            except Exception as e:
+                # Column may not exist yet (added by the clustering scripts)
+                print(f"ℹ Skipped {col}: {e}")
+
+        conn.close()
+        print("\nColumn types optimized.")
+
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+
+if __name__ == "__main__":
+    narrow_column_types()
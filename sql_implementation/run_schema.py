@@ -6,21 +6,16 @@ Password is requested securely at runtime.
 """
 
 import psycopg2
-import getpass
+import mmap
 import sys
 import os
 
+from db_utils import DB_CONFIG, get_connection
+
 # ============================================================================
 # CONFIGURATION
 # ============================================================================
 
-DB_CONFIG = {
-    'host': 'localhost',
-    'port': 5432,
-    'database': 'exoplanet_db',
-    'user': 'postgres'
-}
-
 SCHEMA_FILE = '03_database_schema.sql'
 
 # Check multiple possible locations
@@ -59,29 +54,22 @@ def main():
     print(f"  Database: {DB_CONFIG['database']}")
     print(f"  User: {DB_CONFIG['user']}")
     
-    # Securely prompt for password
-    password = getpass.getpass(f"\nEnter password for user '{DB_CONFIG['user']}': ")
-    
-    if not password:
-        print("\n✗ Error: Password cannot be empty")
-        sys.exit(1)
-    
-    # Add password to config
-    DB_CONFIG['password'] = password
-    
     print("\nConnecting to database...")
-    
+
     try:
-        # Connect to database
-        conn = psycopg2.connect(**DB_CONFIG)
+        # Connect to database (password prompted by the shared helper)
+        conn = get_connection()
         print("✓ Connected successfully")
         
-        # Read SQL file
+        # Read SQL file. mmap hands the bytes to psycopg2 directly -
+        # no decode to a Python str and re-encode on the way to libpq,
+        # which matters if the schema ever grows large with seed data.
         print(f"\nReading schema file: {schema_path}")
-        with open(schema_path, 'r', encoding='utf-8') as f:
-            sql = f.read()
-        
-        print(f"✓ Schema file loaded ({len(sql)} characters)")
+        with open(schema_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                sql = bytes(mm)
+
+        print(f"✓ Schema file loaded ({len(sql)} bytes)")
         
         # Execute SQL
         print("\nExecuting schema creation...")
@@ -105,10 +93,15 @@ def main():
         
         if len(tables) == 3:
             print("✓ All tables created:")
-            for (table_name,) in tables:
-                # Get row count
-                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                count = cursor.fetchone()[0]
+            # One statement for all three counts instead of a round-trip
+            # per table
+            cursor.execute("""
+                SELECT 'discoveries', COUNT(*) FROM discoveries
+                UNION ALL SELECT 'planets', COUNT(*) FROM planets
+                UNION ALL SELECT 'stars', COUNT(*) FROM stars
+                ORDER BY 1
+            """)
+            for table_name, count in cursor.fetchall():
                 print(f"  • {table_name}: {count} rows")
         else:
             print(f"⚠ Warning: Expected 3 tables, found {len(tables)}")